@@ -1,26 +1,33 @@
 #!/usr/bin/env python
 import datetime
 from pathlib import Path
+import re
 import sys
 
 import attain
 
+# Runs of letters/digits (in any script), joined by single inner apostrophes,
+# periods or hyphens.
+_TOKEN_RE = re.compile(r"[^\W_]+(?:['.-][^\W_]+)*")
+
 
 def tokenize(sentence):
-    tokens = []
-    punct = "!@#$%^&*()_+-={}[]\\|;':\",.<>/?"
+    # Unlike splitting on spaces & stripping punctuation off the ends, any
+    # other non-word character also separates tokens. So tabs split words,
+    # "1,000" becomes "1" & "000", & "and/or" becomes "and" & "or".
+    return _TOKEN_RE.findall(sentence.lower())
+
 
-    for word in sentence.split(" "):
-        cleaned = word
-        cleaned = cleaned.strip()
-        cleaned = cleaned.lower()
-        cleaned = cleaned.rstrip(punct)
-        cleaned = cleaned.lstrip(punct)
+def tokenize_file(filename):
+    corpus = []
 
-        if cleaned:
-            tokens.append(cleaned)
+    # Streamed a line at a time, so the whole corpus is never held in memory
+    # as text.
+    with open(filename, "r", encoding="utf-8") as raw_corpus:
+        for line in raw_corpus:
+            corpus.extend(tokenize(line))
 
-    return tokens
+    return corpus
 
 
 class Timer:
@@ -39,34 +46,45 @@ class Timer:
         return self.end - self.start
 
 
-def main(corpus_filename):
+def main(corpus_filename, use_pickle=False):
     cache_filename = corpus_filename.parent.joinpath(f"{corpus_filename.stem}.json")
+    # Unpickling can run arbitrary code, so the (faster) pickle cache is only
+    # ever read/written when asked for, & then only from a directory you
+    # trust (i.e. the cache was written by this script).
+    pickle_filename = cache_filename.with_suffix(".pickle")
     mc = attain.MarkovChain()
-    corpus = []
 
-    if cache_filename.exists():
+    if use_pickle and pickle_filename.exists():
+        mc = attain.MarkovChain.from_pickle(pickle_filename.as_posix())
+    elif cache_filename.exists():
         mc = attain.MarkovChain.from_json(cache_filename.as_posix())
     else:
-        with open(corpus_filename.as_posix(), "r") as raw_corpus:
-            for line in raw_corpus:
-                corpus.extend([word for word in tokenize(line)])
+        corpus = tokenize_file(corpus_filename.as_posix())
 
         with Timer() as t:
             mc.train(corpus)
 
         print(f"Trained in {t.elapsed()}")
 
-        if not cache_filename.exists():
+        if use_pickle:
+            mc.to_pickle(pickle_filename.as_posix())
+        else:
             mc.to_json(cache_filename.as_posix())
 
     return mc.generate_sentence()
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: generate_sentence.py <corpus_filename>")
+    args = sys.argv[1:]
+    use_pickle = "--pickle" in args
+
+    if use_pickle:
+        args.remove("--pickle")
+
+    if len(args) != 1:
+        print("Usage: generate_sentence.py [--pickle] <corpus_filename>")
         sys.exit(1)
 
-    corpus_filename = Path(sys.argv[1])
-    sentence = main(corpus_filename)
+    corpus_filename = Path(args[0])
+    sentence = main(corpus_filename, use_pickle=use_pickle)
     print(sentence)
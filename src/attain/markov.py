@@ -1,10 +1,55 @@
-import copy
+import array
+import collections
 import csv
+import itertools
 import json
+import pickle
 import random
+import warnings
 
 from . import matrix
 
+_ENDING_PUNCT = (".", "!", "?")
+
+
+def _alias_table(weights):
+    """
+    Builds a Vose alias table, for O(1) weighted sampling.
+
+    To sample, pick a uniformly random offset `i`, then keep it with a
+    probability of `prob[i]`, otherwise use `alias[i]`.
+
+    Args:
+        weights (sequence): The (unnormalized, non-negative) weights.
+
+    Returns:
+        tuple: The `prob` (`array.array("d")`) & `alias` (`array.array("i")`)
+            tables.
+    """
+    count = len(weights)
+    total = sum(weights)
+    scaled = [weight * count / total for weight in weights]
+    # Anything left over at the end (through rounding) is always kept.
+    # Typed arrays keep the tables unboxed (8/4 bytes per entry).
+    prob = array.array("d", [1.0]) * count
+    alias = array.array("i", range(count))
+    small = [offset for offset, value in enumerate(scaled) if value < 1.0]
+    large = [offset for offset, value in enumerate(scaled) if value >= 1.0]
+
+    while small and large:
+        less = small.pop()
+        more = large.pop()
+        prob[less] = scaled[less]
+        alias[less] = more
+        scaled[more] = (scaled[more] + scaled[less]) - 1.0
+
+        if scaled[more] < 1.0:
+            small.append(more)
+        else:
+            large.append(more)
+
+    return prob, alias
+
 
 class MarkovChain:
     """
@@ -27,8 +72,13 @@ class MarkovChain:
 
     """
 
+    __slots__ = ("_matrix", "_alias_tables")
+
     def __init__(self):
         self._matrix = matrix.SparseMatrix()
+        # Per-state `(next_states, prob, alias)`, built lazily by
+        # `_build_alias_tables` & discarded when re-training.
+        self._alias_tables = None
 
     def __str__(self):
         return f"{len(self)} known states"
@@ -49,26 +99,32 @@ class MarkovChain:
         Can only be called once against the full dataset. If your dataset
         grows/changes, you need to re-train.
 
+        Each row of the resulting matrix holds the probabilities of
+        transitioning from that state to the next, so each row sums to `1.0`.
+
         Args:
             seq (iterable): A training list of (prepared) words/states from the Real
                 World(tm).
         """
-        last_state = None
-        total_count = len(seq)
-        incr_by = 1 / (total_count - 1)
-
-        for current_state in seq:
-            # Special case for the first state. Nothing to update.
-            if last_state is None:
-                last_state = current_state
-                continue
-
-            # Increment the correct transition.
-            current_value = self._matrix.get(current_state, last_state)
-            self._matrix.set(current_state, last_state, current_value + incr_by)
-
-            # Finally, swap the current into the last state.
-            last_state = current_state
+        # Count the (integer) transitions first, then normalize each row once.
+        # This avoids re-reading/writing the matrix per token, as well as the
+        # floating point error of repeatedly adding tiny increments.
+        # `Counter` & `pairwise` both do the per-token loop in C.
+        counts = collections.Counter(itertools.pairwise(seq))
+        row_totals = collections.Counter()
+
+        for (last_state, _), count in counts.items():
+            row_totals[last_state] += count
+
+        self._matrix = matrix.SparseMatrix.from_triples(
+            (
+                (current_state, last_state, count / row_totals[last_state])
+                for (last_state, current_state), count in counts.items()
+            ),
+            default=self._matrix._default,
+        )
+
+        self._alias_tables = None
 
     def random_state(self):
         """
@@ -77,7 +133,10 @@ class MarkovChain:
         Returns:
             str: The name of the random state.
         """
-        return random.choice([label for label in self._matrix._x_labels.keys()])
+        # Picking an offset (rather than from a copy of all the labels) keeps
+        # this O(1). `range` is indexable, so `choice` works the same way.
+        offset = random.choice(range(len(self._matrix)))
+        return self._matrix.label_at_x_offset(offset)
 
     def _get_state_offset(self, state):
         return self._matrix.x_offset(state)
@@ -87,24 +146,102 @@ class MarkovChain:
         Given a set of known transitions, creates a list of randomized choices
         with representative likelihoods.
 
+        Deprecated: `generate` now samples the transitions directly (via
+        `random.choices`), rather than materializing this list.
+
         Args:
             transitions (dict): A sparse dict of transitions/percentages.
 
         Returns:
-            list: A large, representative list of all the state (offsets) in
-                randomized order.
+            list: A large, representative list of all the state (offsets).
         """
+        warnings.warn(
+            "`create_transition_choices` is deprecated & no longer used by `generate`.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
         choices = []
-        magnitude = len(self)
+        choices_extend = choices.extend
+        magnitude = len(self) * 100
 
         for state, transition in transitions.items():
-            count_to_insert = int(transition * magnitude * 100)
-            to_insert = state
-            choices.extend([to_insert for _ in range(count_to_insert)])
+            count_to_insert = int(transition * magnitude)
+
+            if count_to_insert:
+                # `[x] * n` is a single C-level list repeat.
+                choices_extend([state] * count_to_insert)
 
-        random.shuffle(choices)
+        # No shuffle needed; `random.choice` already picks uniformly.
         return choices
 
+    def _build_alias_tables(self):
+        """
+        Precomputes an alias table for the transitions out of each state.
+
+        The matrix doesn't change between trainings, so this is done once &
+        reused by every `generate` call. States with no transitions (or only
+        zero-weight ones) are left out, so they're treated as dead ends.
+
+        Returns:
+            dict: Keys are state names, values are a tuple of the next states &
+                their alias table (`prob` & `alias`).
+        """
+        mat = self._matrix
+        alias_tables = {}
+
+        for state in mat._y_labels:
+            x_offsets, values = mat.get_sparse_row_view(state)
+
+            # Nothing to sample (& no total to scale the weights by).
+            if not x_offsets or sum(values) <= 0:
+                continue
+
+            next_states = tuple(map(mat.label_at_x_offset, x_offsets))
+            prob, alias = _alias_table(values)
+            alias_tables[state] = (next_states, prob, alias)
+
+        self._alias_tables = alias_tables
+        return alias_tables
+
+    def _sample_next(self, last_state, max_retries=10):
+        """
+        Picks the next state, weighted by the transitions out of `last_state`.
+
+        Uses the precomputed alias table for the row, so each pick is O(1)
+        (two random numbers & a comparison). If the row has no transitions,
+        random states are tried instead.
+
+        Args:
+            last_state (str): The state to transition from.
+            max_retries (int): [Optional] How many random states to try if the
+                row is empty. Default is `10`.
+
+        Returns:
+            str: The next state. If no transitions could be found, returns `None`.
+        """
+        alias_tables = self._alias_tables
+
+        if alias_tables is None:
+            alias_tables = self._build_alias_tables()
+
+        row = alias_tables.get(last_state)
+        retries = 0
+
+        while row is None and retries < max_retries:
+            row = alias_tables.get(self.random_state())
+            retries += 1
+
+        if row is None:
+            return None
+
+        next_states, prob, alias = row
+        offset = random.randrange(len(next_states))
+
+        if random.random() >= prob[offset]:
+            offset = alias[offset]
+
+        return next_states[offset]
+
     def generate(self, length=8, start_state=None):
         """
         Selects a series of choices based on probability/chance, with each
@@ -125,26 +262,90 @@ class MarkovChain:
             states.append(self.random_state())
             last_state = states[0]
 
-        for _ in range(length - 1):
-            row_data = self._matrix.get_sparse_row(last_state)
-            retries = 0
+        sample_next = self._sample_next
+        append_state = states.append
 
-            while len(row_data) <= 0 and retries < 10:
-                row_data = self._matrix.get_sparse_row(self.random_state())
-                retries += 1
+        for _ in range(length - 1):
+            choice = sample_next(last_state)
 
-            # If we hit the retry limit & still couldn't find a row w/ transitions,
-            # bail out.
-            if not row_data:
+            # If we couldn't find a row w/ transitions, bail out.
+            if choice is None:
                 return states
 
-            choices = self.create_transition_choices(row_data)
-            choice = random.choice(choices)
-            states.append(choice)
+            append_state(choice)
             last_state = choice
 
         return states
 
+    def generate_many(self, count, length=8):
+        """
+        Generates many chains at once.
+
+        All the chains advance together, one step at a time. Each step, the
+        chains are grouped by their current state, so each alias table is only
+        fetched once per state rather than once per chain.
+
+        Args:
+            count (int): The number of chains to generate.
+            length (int): [Optional] The number of choices in each chain.
+                Default is `8`.
+
+        Returns:
+            list: The generated Markov chains (each a list of states).
+        """
+        alias_tables = self._alias_tables
+
+        if alias_tables is None:
+            alias_tables = self._build_alias_tables()
+
+        chains = [[self.random_state()] for _ in range(count)]
+        active = chains
+
+        for _ in range(length - 1):
+            by_state = {}
+
+            for chain in active:
+                group = by_state.get(chain[-1])
+
+                if group is None:
+                    by_state[chain[-1]] = [chain]
+                else:
+                    group.append(chain)
+
+            active = []
+
+            for state, group in by_state.items():
+                row = alias_tables.get(state)
+
+                if row is None:
+                    # No transitions out of here. Fall back to the same
+                    # retries `generate` does, chain-by-chain.
+                    for chain in group:
+                        choice = self._sample_next(state)
+
+                        # If we couldn't find a row w/ transitions, this chain
+                        # is done.
+                        if choice is not None:
+                            chain.append(choice)
+                            active.append(chain)
+
+                    continue
+
+                next_states, prob, alias = row
+                size = len(next_states)
+
+                for chain in group:
+                    offset = random.randrange(size)
+
+                    if random.random() >= prob[offset]:
+                        offset = alias[offset]
+
+                    chain.append(next_states[offset])
+
+                active.extend(group)
+
+        return chains
+
     def generate_sentence(self, min_length=5, max_length=10):
         """
         Attempts to create an English-like sentence from the generated Markov Chain.
@@ -162,21 +363,21 @@ class MarkovChain:
         Returns:
             str: A vaguely English-like collection of words emulating a sentence.
         """
-        ending_punct = [".", "!", "?"]
-        words = self.generate(length=random.randint(min_length, max_length + 1))
-        sentence = " ".join(words) + random.choice(ending_punct)
+        words = self.generate(length=random.randint(min_length, max_length))
+        sentence = " ".join(words) + random.choice(_ENDING_PUNCT)
         return sentence.capitalize()
 
     def to_csv(self, filename):
         """
         Exports the trained model to a (verbose) CSV file.
 
-        Warning: On big models/training sets, this can get very large.
+        Warning: On big models/training sets, this can get very large. It's
+        written out a row at a time, so the full CSV is never held in memory.
 
         Args:
             filename (str): The filename to write the CSV data to.
         """
-        with open(filename, "w") as raw_file:
+        with open(filename, "w", newline="") as raw_file:
             writer = csv.writer(raw_file)
             writer.writerow([""] + [state for state in self._matrix.x_labels_in_order])
 
@@ -220,11 +421,18 @@ class MarkovChain:
         Args:
             filename (str): The filename to write the JSON data to.
         """
+        # `json.dumps` only reads what it's given, so there's no need to (deep)
+        # copy anything. The shallow copy shares the rows.
+        to_write = {
+            **self._matrix._data,
+            "__attain_x_labels__": self._matrix._x_labels,
+            "__attain_y_labels__": self._matrix._y_labels,
+        }
+
         with open(filename, "w") as raw_file:
-            to_write = copy.deepcopy(self._matrix._data)
-            to_write["__attain_x_labels__"] = copy.deepcopy(self._matrix._x_labels)
-            to_write["__attain_y_labels__"] = copy.deepcopy(self._matrix._y_labels)
-            json.dump(to_write, raw_file)
+            # Rendering in one go uses the (much faster) C encoder, which
+            # `json.dump`'s chunked writes can't.
+            raw_file.write(json.dumps(to_write))
 
     @classmethod
     def from_json(cls, filename):
@@ -238,14 +446,60 @@ class MarkovChain:
 
         with open(filename, "r") as raw_file:
             to_read = json.load(raw_file)
-            mc._matrix._x_labels = to_read.pop("__attain_x_labels__", [])
-            mc._matrix._y_labels = to_read.pop("__attain_y_labels__", [])
 
-            # We need to convert all the keys from strings to ints.
-            for y_offset, row_data in to_read.items():
-                mc._matrix._data.setdefault(int(y_offset), {})
+        # The label -> offset indexes must stay dicts, so that lookups
+        # remain O(1) hashes.
+        x_labels = to_read.pop("__attain_x_labels__", {})
+        y_labels = to_read.pop("__attain_y_labels__", {})
+        # We need to convert all the keys from strings to ints.
+        data = {
+            int(y_offset): {
+                int(x_offset): value for x_offset, value in row_data.items()
+            }
+            for y_offset, row_data in to_read.items()
+        }
+        mc._matrix = matrix.SparseMatrix.from_data(
+            x_labels, y_labels, data, default=mc._matrix._default
+        )
+        return mc
+
+    def to_pickle(self, filename):
+        """
+        Exports the trained model to a (binary) pickle file.
+
+        Much faster to write/read than JSON on big models, but not
+        human-readable. Only load pickle files you trust!
+
+        Args:
+            filename (str): The filename to write the pickle data to.
+        """
+        with open(filename, "wb") as raw_file:
+            to_write = {
+                "x_labels": self._matrix._x_labels,
+                "y_labels": self._matrix._y_labels,
+                "data": self._matrix._data,
+            }
+            pickle.dump(to_write, raw_file, protocol=5)
+
+    @classmethod
+    def from_pickle(cls, filename):
+        """
+        Imports the trained model from a (binary) pickle file.
+
+        Only load pickle files you trust!
+
+        Args:
+            filename (str): The filename to read the pickle data from.
+        """
+        mc = cls()
 
-                for x_offset, value in row_data.items():
-                    mc._matrix._data[int(y_offset)][int(x_offset)] = value
+        with open(filename, "rb") as raw_file:
+            to_read = pickle.load(raw_file)
 
+        mc._matrix = matrix.SparseMatrix.from_data(
+            to_read["x_labels"],
+            to_read["y_labels"],
+            to_read["data"],
+            default=mc._matrix._default,
+        )
         return mc
@@ -1,4 +1,43 @@
-from functools import cached_property
+import array
+import itertools
+import sys
+
+
+def _intern_labels(labels):
+    """
+    Interns the (string) keys of a label -> offset dict.
+
+    Labels loaded from disk are fresh string objects, unlike those added via
+    `SparseMatrix.set`.
+
+    Args:
+        labels (dict): The label -> offset dict.
+
+    Returns:
+        dict: The same mapping, with interned labels.
+    """
+    return {
+        (sys.intern(label) if isinstance(label, str) else label): offset
+        for label, offset in labels.items()
+    }
+
+
+def _invert_labels(labels):
+    """
+    Builds the offset -> label list for a label -> offset dict.
+
+    Args:
+        labels (dict): The label -> offset dict.
+
+    Returns:
+        list: The labels, indexed by offset.
+    """
+    inverted = [None] * len(labels)
+
+    for label, offset in labels.items():
+        inverted[offset] = label
+
+    return inverted
 
 
 class SparseMatrix:
@@ -9,6 +48,15 @@ class SparseMatrix:
     for the Markov chain. This utilizes far less memory by only retaining values
     explicitly set in the matrix.
 
+    Values are written into a dict-of-dicts (cheap to update), then compacted
+    into compressed sparse row (CSR) arrays the first time rows are read (&
+    column (CSC) arrays, the first time columns are read). These are
+    `array.array`s, so when every value is a float (e.g. a trained
+    `MarkovChain`), they're stored unboxed (8 bytes per double). Otherwise, the
+    values are kept in a list, exactly as set. Don't interleave lots of `set`
+    calls with row/column reads, as each `set` means the arrays need
+    rebuilding.
+
     Usage::
 
         # The default here is optional (typically `0.0`).
@@ -23,14 +71,85 @@ class SparseMatrix:
 
     """
 
+    __slots__ = (
+        "_x_labels",
+        "_y_labels",
+        "_x_inverted_cache",
+        "_y_inverted_cache",
+        "_data",
+        "_default",
+        "_indptr",
+        "_indices",
+        "_values",
+        "_col_indptr",
+        "_col_indices",
+        "_col_values",
+    )
+
     def __init__(self, default=0.0):
         self._x_labels = {}
         self._y_labels = {}
-        self._x_inverted_cache = None
-        self._y_inverted_cache = None
+        # Offset -> label, as lists indexed by offset. Labels are only ever
+        # appended, so these are kept up to date by `set`, rather than being
+        # rebuilt. Anything replacing the labels must replace these too (see
+        # `from_data`).
+        self._x_inverted_cache = []
+        self._y_inverted_cache = []
         # The `_data` is a dict-of-dicts; in row-column-value order.
         self._data = {}
         self._default = default
+        # A compressed sparse row (CSR) copy of `_data`, for fast row reads.
+        # Built lazily by `_freeze`, & thrown away by `set`.
+        self._indptr = None
+        self._indices = None
+        self._values = None
+        # The compressed sparse column (CSC) mirror, for fast column reads.
+        # Built lazily by `_freeze_columns`, & thrown away by `set`.
+        self._col_indptr = None
+        self._col_indices = None
+        self._col_values = None
+
+    @classmethod
+    def from_triples(cls, triples, default=0.0):
+        """
+        Builds a matrix from many values at once.
+
+        Much faster than calling `set` for each value. If a location appears
+        more than once, the last value wins.
+
+        Args:
+            triples (iterable): `(x, y, value)` tuples, the same as `set` takes.
+            default (any): [Optional] The default value. Default is `0.0`.
+
+        Returns:
+            SparseMatrix: The populated matrix.
+        """
+        mat = cls(default=default)
+        mat.set_many(triples)
+        return mat
+
+    @classmethod
+    def from_data(cls, x_labels, y_labels, data, default=0.0):
+        """
+        Builds a matrix from its label indexes & sparse rows (e.g. loaded from
+        a saved model).
+
+        Args:
+            x_labels (dict): The column label -> offset index.
+            y_labels (dict): The row label -> offset index.
+            data (dict): The rows, as row offset -> `{column offset: value}`.
+            default (any): [Optional] The default value. Default is `0.0`.
+
+        Returns:
+            SparseMatrix: The populated matrix.
+        """
+        mat = cls(default=default)
+        mat._x_labels = _intern_labels(x_labels)
+        mat._y_labels = _intern_labels(y_labels)
+        mat._x_inverted_cache = _invert_labels(mat._x_labels)
+        mat._y_inverted_cache = _invert_labels(mat._y_labels)
+        mat._data = data
+        return mat
 
     def __str__(self):
         return f"{len(self._x_labels)}x{len(self._y_labels)}"
@@ -52,21 +171,15 @@ class SparseMatrix:
     def y_labels(self):
         return self._y_labels.keys()
 
-    @cached_property
+    @property
     def x_labels_in_order(self):
-        labels = sorted(
-            [[key, value] for key, value in self._x_labels.items()],
-            key=lambda x: x[1],
-        )
-        return [label[0] for label in labels]
+        # Offsets are handed out in insertion order, which dicts preserve.
+        return list(self._x_labels)
 
-    @cached_property
+    @property
     def y_labels_in_order(self):
-        labels = sorted(
-            [[key, value] for key, value in self._y_labels.items()],
-            key=lambda x: x[1],
-        )
-        return [label[0] for label in labels]
+        # Offsets are handed out in insertion order, which dicts preserve.
+        return list(self._y_labels)
 
     def x_offset(self, x):
         """
@@ -102,10 +215,13 @@ class SparseMatrix:
         Returns:
             str: The column label. If not found, returns `None`.
         """
-        if self._x_inverted_cache is None:
-            self._x_inverted_cache = {v: k for k, v in self._x_labels.items()}
+        inverted = self._x_inverted_cache
 
-        return self._x_inverted_cache.get(x_offset)
+        # Lets `label_at_x_offset(mat.x_offset(missing))` return `None`, too.
+        if isinstance(x_offset, int) and 0 <= x_offset < len(inverted):
+            return inverted[x_offset]
+
+        return None
 
     def label_at_y_offset(self, y_offset):
         """
@@ -117,10 +233,13 @@ class SparseMatrix:
         Returns:
             str: The row label. If not found, returns `None`.
         """
-        if self._y_inverted_cache is None:
-            self._y_inverted_cache = {v: k for k, v in self._y_labels.items()}
+        inverted = self._y_inverted_cache
+
+        # Lets `label_at_y_offset(mat.y_offset(missing))` return `None`, too.
+        if isinstance(y_offset, int) and 0 <= y_offset < len(inverted):
+            return inverted[y_offset]
 
-        return self._y_inverted_cache.get(y_offset)
+        return None
 
     def get(self, x, y):
         """
@@ -136,15 +255,57 @@ class SparseMatrix:
             any: The value at that location. If not set, returns the default
                 value for the `SparseMatrix`.
         """
-        x_offset = self.x_offset(x)
-        y_offset = self.y_offset(y)
+        # Bail out as early as possible, since missing values are the common
+        # case in a sparse matrix.
+        y_offset = self._y_labels.get(y)
 
-        if x_offset is None or y_offset is None:
+        if y_offset is None:
+            return self._default
+
+        row = self._data.get(y_offset)
+
+        if row is None:
+            return self._default
+
+        x_offset = self._x_labels.get(x)
+
+        if x_offset is None:
             return self._default
 
-        row = self._data.get(y_offset, {})
         return row.get(x_offset, self._default)
 
+    def get_batch(self, xs, ys):
+        """
+        Fetches the values at many column/row locations at once.
+
+        The same as calling `get` for each pair, but with the lookups bound
+        locally, so it's a little faster for large batches.
+
+        Args:
+            xs (iterable): The column names.
+            ys (iterable): The row names. Paired up with `xs`, in order.
+
+        Returns:
+            list: The value at each location. Unset ones are the default value
+                for the `SparseMatrix`.
+
+        Raises:
+            ValueError: If `xs` & `ys` aren't the same length.
+        """
+        x_labels_get = self._x_labels.get
+        y_labels_get = self._y_labels.get
+        data_get = self._data.get
+        default = self._default
+        empty = {}
+        values = []
+        append = values.append
+
+        for x, y in zip(xs, ys, strict=True):
+            row = data_get(y_labels_get(y), empty)
+            append(row.get(x_labels_get(x), default))
+
+        return values
+
     def set(self, x, y, value):
         """
         Sets a value at a given column/row location.
@@ -157,30 +318,190 @@ class SparseMatrix:
         Returns:
             None
         """
-        # Clear the caches.
-        self._x_inverted_cache = None
-        self._y_inverted_cache = None
+        # The compressed copies are now stale.
+        self._indptr = None
+        self._col_indptr = None
 
-        x_offset = self.x_offset(x)
-        y_offset = self.y_offset(y)
+        x_labels = self._x_labels
+        y_labels = self._y_labels
+        x_offset = x_labels.get(x)
+        y_offset = y_labels.get(y)
 
+        # New labels get interned, so repeat lookups can short-circuit on
+        # identity & identical labels share storage.
         if x_offset is None:
-            x_offset = len(self._x_labels)
-            self._x_labels[x] = x_offset
+            if isinstance(x, str):
+                x = sys.intern(x)
+
+            x_offset = len(x_labels)
+            x_labels[x] = x_offset
+            self._x_inverted_cache.append(x)
 
         if y_offset is None:
-            y_offset = len(self._y_labels)
-            self._y_labels[y] = y_offset
+            if isinstance(y, str):
+                y = sys.intern(y)
+
+            y_offset = len(y_labels)
+            y_labels[y] = y_offset
+            self._y_inverted_cache.append(y)
+
+        row = self._data.get(y_offset)
 
-        self._data.setdefault(y_offset, {})
-        self._data[y_offset].setdefault(x_offset, {})
-        self._data[y_offset][x_offset] = value
+        if row is None:
+            row = {}
+            self._data[y_offset] = row
+
+        row[x_offset] = value
+
+    def set_many(self, triples):
+        """
+        Sets many values at once.
+
+        Much faster than calling `set` for each value, as the caches are only
+        cleared once & the bookkeeping is done with local lookups. If a
+        location appears more than once, the last value wins.
+
+        Args:
+            triples (iterable): `(x, y, value)` tuples, the same as `set` takes.
+
+        Returns:
+            None
+        """
+        # The compressed copies are now stale. Dropped up front, so they can't
+        # outlive a partial write (e.g. if `triples` raises part-way through).
+        self._indptr = None
+        self._col_indptr = None
+
+        x_labels = self._x_labels
+        y_labels = self._y_labels
+        x_inverted = self._x_inverted_cache
+        y_inverted = self._y_inverted_cache
+        data = self._data
+        intern = sys.intern
+
+        for x, y, value in triples:
+            x_offset = x_labels.get(x)
+
+            if x_offset is None:
+                if isinstance(x, str):
+                    x = intern(x)
+
+                x_offset = len(x_labels)
+                x_labels[x] = x_offset
+                x_inverted.append(x)
+
+            y_offset = y_labels.get(y)
+
+            if y_offset is None:
+                if isinstance(y, str):
+                    y = intern(y)
+
+                y_offset = len(y_labels)
+                y_labels[y] = y_offset
+                y_inverted.append(y)
+                data[y_offset] = {x_offset: value}
+                continue
+
+            row = data.get(y_offset)
+
+            if row is None:
+                data[y_offset] = {x_offset: value}
+            else:
+                row[x_offset] = value
+
+    def _freeze(self):
+        """
+        Builds the compressed sparse row (CSR) copy of the data, if needed.
+
+        The values for row offset `y` live in
+        `_values[_indptr[y]:_indptr[y + 1]]`, with their column offsets (in
+        sorted order) at the same positions in `_indices`. Changing the matrix
+        via `set` discards these, & they'll be rebuilt on next use.
+
+        Returns:
+            None
+        """
+        if self._indptr is not None:
+            return
+
+        indptr = array.array("i", [0])
+        indices = array.array("i")
+        values = []
+
+        for y_offset in range(len(self._y_labels)):
+            row = self._data.get(y_offset)
+
+            if row:
+                x_offsets = sorted(row)
+                indices.extend(x_offsets)
+                values.extend([row[x_offset] for x_offset in x_offsets])
+
+            indptr.append(len(indices))
+
+        # Only pack the values into doubles if that's lossless. Anything else
+        # (ints, `None`, etc.) stays a list, so reads match `get` exactly.
+        if all(value.__class__ is float for value in values):
+            values = array.array("d", values)
+
+        self._indices = indices
+        self._values = values
+        self._indptr = indptr
+
+    def _freeze_columns(self):
+        """
+        Builds the compressed sparse column (CSC) copy of the data, if needed.
+
+        The same as the CSR arrays from `_freeze`, but by column, with row
+        offsets in `_col_indices`. Only built once columns are actually read,
+        & discarded by `set` the same way.
+
+        Returns:
+            None
+        """
+        if self._col_indptr is not None:
+            return
+
+        self._freeze()
+        indptr = self._indptr
+        indices = self._indices
+        values = self._values
+
+        # Transpose the CSR with a counting sort. Walking the rows in order
+        # leaves each column's row offsets sorted.
+        col_counts = [0] * len(self._x_labels)
+
+        for x_offset in indices:
+            col_counts[x_offset] += 1
+
+        col_indptr = array.array("i", [0])
+        col_indptr.extend(itertools.accumulate(col_counts))
+        col_indices = array.array("i", [0]) * len(indices)
+        # The same storage as the CSR values.
+        if isinstance(values, array.array):
+            col_values = array.array("d", [0.0]) * len(indices)
+        else:
+            col_values = [None] * len(indices)
+        next_slots = col_indptr.tolist()
+
+        for y_offset in range(len(indptr) - 1):
+            for offset in range(indptr[y_offset], indptr[y_offset + 1]):
+                x_offset = indices[offset]
+                slot = next_slots[x_offset]
+                col_indices[slot] = y_offset
+                col_values[slot] = values[offset]
+                next_slots[x_offset] = slot + 1
+
+        self._col_indices = col_indices
+        self._col_values = col_values
+        self._col_indptr = col_indptr
 
     def get_sparse_row(self, y):
         """
         Returns a sparse "row" (dict) for a given row.
 
-        Mostly internal, but there if you need it.
+        Mostly internal, but there if you need it. Read from the compressed
+        (CSR) data, so the row is in column order. The values are exactly as
+        set, so `get_sparse_row(y)[x] == get(x, y)`.
 
         Args:
             y (str): The row name.
@@ -189,19 +510,71 @@ class SparseMatrix:
             dict: A sparse representation of the row. Keys are **offsets** of the
                 columns, values are the value at locations that are set.
         """
-        row_data = {}
         y_offset = self.y_offset(y)
 
-        for x_offset, data in self._data.get(y_offset, {}).items():
-            row_data[self.label_at_x_offset(x_offset)] = data
+        if y_offset is None:
+            return {}
+
+        self._freeze()
+        start = self._indptr[y_offset]
+        end = self._indptr[y_offset + 1]
+
+        x_inverted = self._x_inverted_cache
+        return dict(
+            zip(
+                map(x_inverted.__getitem__, self._indices[start:end]),
+                self._values[start:end],
+            )
+        )
 
-        return row_data
+    def get_sparse_row_view(self, y):
+        """
+        Returns the column offsets & values set in a given row, without copying.
+
+        Both are `memoryview` slices into the compressed (CSR) arrays, so
+        they're cheap to get but only valid until the matrix is next changed.
+        Use `get_sparse_row` if you need labels or something to hold on to.
+
+        Only available when every value in the matrix is a float (so they're
+        stored as doubles), as is the case for a trained `MarkovChain`.
+
+        Args:
+            y (str): The row name.
+
+        Returns:
+            tuple: The column **offsets** (in column order) & the values at
+                those locations. Both are empty if the row isn't present.
+
+        Raises:
+            TypeError: If the matrix holds values other than floats.
+        """
+        self._freeze()
+
+        if not isinstance(self._values, array.array):
+            raise TypeError(
+                "Row views need every value to be a float. Use `get_sparse_row`."
+            )
+
+        y_offset = self.y_offset(y)
+
+        if y_offset is None:
+            start = end = 0
+        else:
+            start = self._indptr[y_offset]
+            end = self._indptr[y_offset + 1]
+
+        return (
+            memoryview(self._indices)[start:end],
+            memoryview(self._values)[start:end],
+        )
 
     def get_sparse_column(self, x):
         """
         Returns a sparse "column" (dict) for a given column.
 
-        Mostly internal, but there if you need it.
+        Mostly internal, but there if you need it. Read from the compressed
+        (CSC) data, so only the set values in the column are touched. The
+        values are exactly as set, so `get_sparse_column(x)[y] == get(x, y)`.
 
         Args:
             x (str): The column name.
@@ -210,14 +583,22 @@ class SparseMatrix:
             dict: A sparse representation of the column. Keys are **offsets** of
                 the columns, values are the value at locations that are set.
         """
-        column_data = {}
         x_offset = self.x_offset(x)
 
-        for y_offset, data in self._data.items():
-            if x_offset in data:
-                column_data[self.label_at_y_offset(y_offset)] = data[x_offset]
-
-        return column_data
+        if x_offset is None:
+            return {}
+
+        self._freeze_columns()
+        start = self._col_indptr[x_offset]
+        end = self._col_indptr[x_offset + 1]
+
+        y_inverted = self._y_inverted_cache
+        return dict(
+            zip(
+                map(y_inverted.__getitem__, self._col_indices[start:end]),
+                self._col_values[start:end],
+            )
+        )
 
     def get_row(self, y):
         """
@@ -230,16 +611,39 @@ class SparseMatrix:
             list: A full representation of the row, populated with default values
                 where not explicitly set.
         """
-        row_data = []
-        sparse_row = self.get_sparse_row(y)
-        x_offsets_in_order = sorted(self._x_inverted_cache)
+        row_data = [self._default] * len(self._x_labels)
+        y_offset = self.y_offset(y)
+
+        if y_offset is None:
+            return row_data
+
+        self._freeze()
+        start = self._indptr[y_offset]
+        end = self._indptr[y_offset + 1]
 
-        for offset in x_offsets_in_order:
-            x_label = self._x_inverted_cache[offset]
-            row_data.append(sparse_row.get(x_label, self._default))
+        # Pairing up the slices avoids two index lookups per value.
+        for x_offset, value in zip(self._indices[start:end], self._values[start:end]):
+            row_data[x_offset] = value
 
         return row_data
 
+    def get_row_array(self, y):
+        """
+        Returns a full row, as if the matrix were fully populated.
+
+        Unlike `get_row`, the values are packed into an `array.array` of
+        doubles, rather than a list of (boxed) Python objects. So the values (&
+        the default) must be real numbers, & are converted to floats.
+
+        Args:
+            y (str): The row name.
+
+        Returns:
+            array.array: A full representation of the row, populated with
+                default values where not explicitly set.
+        """
+        return array.array("d", self.get_row(y))
+
     def get_column(self, x):
         """
         Returns a full column, as if the matrix were fully populated.
@@ -251,12 +655,70 @@ class SparseMatrix:
             list: A full representation of the column, populated with default values
                 where not explicitly set.
         """
-        column_data = []
-        sparse_col = self.get_sparse_column(x)
-        y_offsets_in_order = sorted(self._y_inverted_cache)
+        column_data = [self._default] * len(self._y_labels)
+        x_offset = self.x_offset(x)
 
-        for offset in y_offsets_in_order:
-            y_label = self._y_inverted_cache[offset]
-            column_data.append(sparse_col.get(y_label, self._default))
+        if x_offset is None:
+            return column_data
+
+        self._freeze_columns()
+        start = self._col_indptr[x_offset]
+        end = self._col_indptr[x_offset + 1]
+
+        # Pairing up the slices avoids two index lookups per value.
+        for y_offset, value in zip(
+            self._col_indices[start:end], self._col_values[start:end]
+        ):
+            column_data[y_offset] = value
 
         return column_data
+
+    def get_column_array(self, x):
+        """
+        Returns a full column, as if the matrix were fully populated.
+
+        Unlike `get_column`, the values are packed into an `array.array` of
+        doubles, rather than a list of (boxed) Python objects. So the values (&
+        the default) must be real numbers, & are converted to floats.
+
+        Args:
+            x (str): The column name.
+
+        Returns:
+            array.array: A full representation of the column, populated with
+                default values where not explicitly set.
+        """
+        return array.array("d", self.get_column(x))
+
+    def to_scipy_csr(self):
+        """
+        Returns the matrix as a SciPy `csr_matrix`, for fast matrix math.
+
+        Rows & columns are in offset order (see `label_at_y_offset` &
+        `label_at_x_offset`). The values are converted to floats, so must be
+        real numbers. Unset locations are `0.0` in SciPy, regardless of the
+        `default`.
+
+        Requires SciPy to be installed (`attain` itself doesn't depend on it).
+
+        Returns:
+            scipy.sparse.csr_matrix: The compressed matrix.
+
+        Raises:
+            TypeError: If any value isn't a real number.
+        """
+        self._freeze()
+        values = self._values
+
+        # Ints, `None`, etc. are kept in a list. Packing them into doubles
+        # checks they're all numbers (& fixes the dtype whatever they are).
+        if not isinstance(values, array.array):
+            values = array.array("d", values)
+
+        from scipy.sparse import csr_matrix
+
+        return csr_matrix(
+            (values, self._indices, self._indptr),
+            shape=(len(self._y_labels), len(self._x_labels)),
+            dtype=float,
+        )
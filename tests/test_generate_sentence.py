@@ -0,0 +1,74 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture
+def generate_sentence():
+    script_path = Path(__file__).parent.parent / "scripts" / "generate_sentence.py"
+    spec = importlib.util.spec_from_file_location("generate_sentence", script_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def corpus_text():
+    return (
+        "Hello, world! Say hello.\n"
+        "The café was naïve about e-mail in the U.S.A.\n"
+        "She said 'quoted' & didn't -- really -- mean it.\n"
+    )
+
+
+def test_tokenize_file(generate_sentence, corpus_text, tmp_path):
+    corpus_path = tmp_path / "corpus.txt"
+    corpus_path.write_text(corpus_text, encoding="utf-8")
+
+    tokens = generate_sentence.tokenize_file(corpus_path.as_posix())
+    assert tokens == [
+        "hello",
+        "world",
+        "say",
+        "hello",
+        "the",
+        "café",
+        "was",
+        "naïve",
+        "about",
+        "e-mail",
+        "in",
+        "the",
+        "u.s.a",
+        "she",
+        "said",
+        "quoted",
+        "didn't",
+        "really",
+        "mean",
+        "it",
+    ]
+
+
+def test_tokenize(generate_sentence):
+    # Splitting on spaces & stripping the ends would keep these together
+    # ("tab\tseparated", "1,000", "and/or", "hello,world").
+    assert generate_sentence.tokenize("Tab\tseparated 1,000 and/or hello,world") == [
+        "tab",
+        "separated",
+        "1",
+        "000",
+        "and",
+        "or",
+        "hello",
+        "world",
+    ]
+    assert generate_sentence.tokenize("  -- 'Quoted' U.S.A.!") == ["quoted", "u.s.a"]
+    assert generate_sentence.tokenize("") == []
+
+
+def test_tokenize_file_empty(generate_sentence, tmp_path):
+    corpus_path = tmp_path / "empty.txt"
+    corpus_path.write_text("")
+    assert generate_sentence.tokenize_file(corpus_path.as_posix()) == []
@@ -2,6 +2,7 @@ import csv
 from pathlib import Path
 import random
 import shutil
+import sys
 
 import pytest
 
@@ -58,6 +59,18 @@ def test_train(small_corpus):
     assert len(mc) == 16
 
 
+def test_train_normalizes_rows(small_corpus):
+    mc = markov.MarkovChain()
+    # Any iterable works, not just lists.
+    mc.train(iter(small_corpus))
+
+    for state in mc._matrix.y_labels:
+        assert sum(mc._matrix.get_sparse_row(state).values()) == pytest.approx(1.0)
+
+    assert mc._matrix.get("kitty", "hello") == pytest.approx(1 / 3)
+    assert mc._matrix.get("be", "to") == 1.0
+
+
 def test_dunder_methods(small_corpus):
     mc = markov.MarkovChain()
     mc.train(small_corpus)
@@ -90,22 +103,66 @@ def test_generate(small_corpus):
 
     assert mc.generate() == [
         "be",
-        "that",
-        "is",
-        "the",
-        "question",
-        "hello",
+        "or",
+        "not",
         "to",
         "be",
+        "or",
+        "not",
+        "to",
     ]
     assert mc.generate(length=4) == [
-        "my",
-        "favorite",
-        "character",
-        "here",
+        "is",
+        "the",
+        "question",
+        "hello",
     ]
 
 
+def test_generate_zero_weight_row(small_corpus):
+    mc = markov.MarkovChain()
+    mc.train(small_corpus)
+    # A row whose weights sum to zero has nothing to sample from.
+    mc._matrix.set("a", "z", 0.0)
+
+    random.seed(0)
+    assert "z" not in mc._build_alias_tables()
+    assert len(mc.generate()) == 8
+    assert mc.generate_sentence()
+
+
+def test_generate_many(small_corpus):
+    mc = markov.MarkovChain()
+    mc.train(small_corpus)
+
+    # To keep the randomness consistent.
+    random.seed(a=1)
+
+    chains = mc.generate_many(5, length=4)
+    assert len(chains) == 5
+
+    for chain in chains:
+        assert len(chain) == 4
+
+        # Every step should follow a trained transition.
+        for last_state, current_state in zip(chain, chain[1:]):
+            assert mc._matrix.get(current_state, last_state) > 0
+
+    assert mc.generate_many(0) == []
+
+
+def test_alias_table():
+    prob, alias = markov._alias_table([1, 3])
+    assert prob.typecode == "d"
+    assert list(prob) == [0.5, 1.0]
+    assert list(alias) == [1, 1]
+
+    # Zero weights can only ever be aliased away.
+    prob, alias = markov._alias_table([0.1, 0.6, 0.3, 0.0])
+    assert prob[3] == 0.0
+    assert alias[3] != 3
+
+
 def test_generate_sentence(small_corpus):
     mc = markov.MarkovChain()
     mc.train(small_corpus)
@@ -113,12 +170,24 @@ def test_generate_sentence(small_corpus):
     # To keep the randomness consistent.
     random.seed(a=1)
 
-    assert mc.generate_sentence() == "Hello world say hello world say."
+    assert mc.generate_sentence() == "Hello to be that is my."
     assert (
         mc.generate_sentence()
-        == "My favorite character here kitty is the question hello?"
+        == "Character here kitty is the question hello to be that!"
     )
-    assert mc.generate_sentence(min_length=3, max_length=4) == "That is my?"
+    assert mc.generate_sentence(min_length=3, max_length=4) == "That is the?"
+
+
+def test_generate_sentence_length(small_corpus):
+    mc = markov.MarkovChain()
+    mc.train(small_corpus)
+
+    # To keep the randomness consistent.
+    random.seed(a=1)
+
+    for _ in range(50):
+        sentence = mc.generate_sentence(min_length=2, max_length=3)
+        assert len(sentence.split()) <= 3
 
 
 def test_to_csv(small_corpus, data_dir):
@@ -161,10 +230,10 @@ def test_to_csv(small_corpus, data_dir):
         row_0 = next(reader)
         assert row_0 == [
             "hello",
-            "0.045454545454545456",
+            "0.3333333333333333",
             "0.0",
             "0.0",
-            "0.045454545454545456",
+            "0.3333333333333333",
             "0.0",
             "0.0",
             "0.0",
@@ -172,7 +241,7 @@ def test_to_csv(small_corpus, data_dir):
             "0.0",
             "0.0",
             "0.0",
-            "0.045454545454545456",
+            "0.3333333333333333",
             "0.0",
             "0.0",
             "0.0",
@@ -182,7 +251,7 @@ def test_to_csv(small_corpus, data_dir):
         assert row_1 == [
             "world",
             "0.0",
-            "0.045454545454545456",
+            "1.0",
             "0.0",
             "0.0",
             "0.0",
@@ -253,18 +322,44 @@ def test_json_round_trip(small_corpus, data_dir):
     assert "hello" in new_mc
     assert "world" in new_mc
     assert "kitty" in new_mc
+    assert new_mc._matrix.label_at_x_offset(0) is sys.intern("world")
 
-    # Reach in a little, just to make sure things look right.
-    assert new_mc._matrix._data[0] == {
-        0: 0.045454545454545456,
-        3: 0.045454545454545456,
-        11: 0.045454545454545456,
+    # Check a few rows, just to make sure things look right.
+    assert new_mc._matrix.get_sparse_row("hello") == {
+        "world": 0.3333333333333333,
+        "to": 0.3333333333333333,
+        "kitty": 0.3333333333333333,
     }
-    assert new_mc._matrix._data[1] == {
-        1: 0.045454545454545456,
+    assert new_mc._matrix.get_sparse_row("world") == {
+        "say": 1.0,
     }
-    assert new_mc._matrix._data[3] == {
-        4: 0.09090909090909091,
+    assert new_mc._matrix.get_sparse_row("to") == {
+        "be": 1.0,
     }
 
     shutil.rmtree(data_dir.as_posix(), ignore_errors=True)
+
+
+def test_pickle_round_trip(small_corpus, data_dir):
+    mc = markov.MarkovChain()
+    mc.train(small_corpus)
+
+    pickle_path = data_dir / "transitions.pickle"
+
+    shutil.rmtree(data_dir.as_posix(), ignore_errors=True)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    assert not pickle_path.exists()
+
+    mc.to_pickle(pickle_path.as_posix())
+
+    assert pickle_path.exists()
+
+    new_mc = markov.MarkovChain.from_pickle(pickle_path.as_posix())
+    assert len(new_mc) == 16
+    assert "hello" in new_mc
+    assert "kitty" in new_mc
+    for state in ("hello", "kitty", "to", "question"):
+        assert new_mc._matrix.get_sparse_row(state) == mc._matrix.get_sparse_row(state)
+    assert new_mc._matrix.label_at_y_offset(0) is sys.intern("hello")
+
+    shutil.rmtree(data_dir.as_posix(), ignore_errors=True)
@@ -1,3 +1,5 @@
+import sys
+
 import pytest
 
 from attain import matrix
@@ -26,8 +28,18 @@ def small_matrix():
     return mat
 
 
-@pytest.fixture
-def medium_matrix():
+MEDIUM_TRIPLES = [
+    ("a", "a", 1),
+    ("a", "b", 0.5),
+    ("b", "b", 0.2),
+    ("c", "a", 0.3),
+    ("c", "d", 1),
+    ("d", "c", 0.6),
+]
+
+
+@pytest.fixture(params=["set", "from_triples"])
+def medium_matrix(request):
     """
     Matrix:
     |   | a   | b   | c   | d   |
@@ -68,14 +80,36 @@ def medium_matrix():
             3: 0.6,
         },
     }
+
+    Built both cell-by-cell (`set`) & in bulk (`from_triples`), so every test
+    using it checks that the two end up the same.
     """
+    if request.param == "from_triples":
+        return matrix.SparseMatrix.from_triples(MEDIUM_TRIPLES)
+
     mat = matrix.SparseMatrix()
-    mat.set("a", "a", 1)
-    mat.set("a", "b", 0.5)
-    mat.set("b", "b", 0.2)
-    mat.set("c", "a", 0.3)
-    mat.set("c", "d", 1)
-    mat.set("d", "c", 0.6)
+
+    for x, y, value in MEDIUM_TRIPLES:
+        mat.set(x, y, value)
+
+    return mat
+
+
+@pytest.fixture
+def mixed_matrix():
+    """
+    Matrix (`default=None`):
+    |   | a     | b       |
+    | - | ----- | ------- |
+    | a | 2**60 | "hello" |
+    | b | 3     |         |
+
+    None of the values are floats, so they're kept exactly as set.
+    """
+    mat = matrix.SparseMatrix(default=None)
+    mat.set("a", "a", 2**60)
+    mat.set("b", "a", "hello")
+    mat.set("a", "b", 3)
     return mat
 
 
@@ -89,11 +123,68 @@ def test_matrix_set():
     assert mat._y_labels == {
         "world": 0,
     }
-    assert mat._data == {
-        0: {
-            0: 0.5,
-        },
-    }
+    assert mat.get("hello", "world") == 0.5
+    assert mat.get("hello", "hello") == 0.0
+
+
+def test_matrix_set_interns_labels():
+    mat = matrix.SparseMatrix()
+    # Built at runtime, so not interned already.
+    label = "".join(["hel", "lo"])
+    mat.set(label, label, 0.5)
+
+    assert mat.label_at_x_offset(0) is sys.intern("hello")
+    assert mat.label_at_y_offset(0) is sys.intern("hello")
+
+
+def test_from_triples(medium_matrix):
+    # Last one wins.
+    mat = matrix.SparseMatrix.from_triples(MEDIUM_TRIPLES + [("b", "b", 0.25)])
+
+    assert mat._x_labels == medium_matrix._x_labels
+    assert mat._y_labels == medium_matrix._y_labels
+    assert mat.get("b", "b") == 0.25
+    assert mat.get_row("d") == medium_matrix.get_row("d")
+    assert mat.label_at_y_offset(3) == "c"
+
+
+def test_set_many(medium_matrix):
+    medium_matrix._freeze()
+    medium_matrix.set_many(
+        [
+            ("a", "a", 5),
+            ("e", "a", 0.5),
+            ("a", "f", 0.1),
+        ]
+    )
+
+    assert medium_matrix.get("a", "a") == 5
+    assert medium_matrix.get("e", "a") == 0.5
+    assert medium_matrix.get("a", "f") == 0.1
+    assert medium_matrix.x_labels_in_order == ["a", "b", "c", "d", "e"]
+    assert medium_matrix.y_labels_in_order == ["a", "b", "d", "c", "f"]
+
+    # The stale caches were thrown away.
+    assert medium_matrix._indptr is None
+    assert medium_matrix.get_row("a") == [5, 0.0, 0.3, 0.0, 0.5]
+
+
+def test_set_many_partial_write(medium_matrix):
+    medium_matrix._freeze()
+    medium_matrix._freeze_columns()
+
+    def triples():
+        yield ("a", "a", 5)
+        raise RuntimeError("Out of triples.")
+
+    with pytest.raises(RuntimeError):
+        medium_matrix.set_many(triples())
+
+    # What did get written is visible everywhere, not just via `get`.
+    assert medium_matrix.get("a", "a") == 5
+    assert medium_matrix.get_row("a") == [5, 0.0, 0.3, 0.0]
+    assert medium_matrix.get_sparse_row("a") == {"a": 5, "c": 0.3}
+    assert medium_matrix.get_sparse_column("a") == {"a": 5, "b": 0.5}
 
 
 def test_small_matrix_internals(small_matrix):
@@ -103,11 +194,9 @@ def test_small_matrix_internals(small_matrix):
     assert small_matrix._y_labels == {
         "world": 0,
     }
-    assert small_matrix._data == {
-        0: {
-            0: 0.5,
-        },
-    }
+    x_offsets, values = small_matrix.get_sparse_row_view("world")
+    assert x_offsets.tolist() == [0]
+    assert list(values) == [0.5]
 
 
 def test_small_matrix_get(small_matrix):
@@ -130,23 +219,19 @@ def test_medium_matrix_internals(medium_matrix):
         "c": 3,
         "d": 2,
     }
-    assert medium_matrix._data == {
-        0: {
-            0: 1,
-            2: 0.3,
-        },
-        1: {
-            0: 0.5,
-            1: 0.2,
-        },
-        2: {
-            2: 1,
-        },
-        3: {
-            3: 0.6,
-        },
+
+    # Row: {column offset: value}
+    expected = {
+        "a": {0: 1, 2: 0.3},
+        "b": {0: 0.5, 1: 0.2},
+        "d": {2: 1},
+        "c": {3: 0.6},
     }
 
+    for y, row in expected.items():
+        sparse_row = medium_matrix.get_sparse_row(y)
+        assert {medium_matrix.x_offset(x): v for x, v in sparse_row.items()} == row
+
 
 def test_medium_matrix_get(medium_matrix):
     assert medium_matrix.get("a", "a") == 1
@@ -160,6 +245,29 @@ def test_medium_matrix_get(medium_matrix):
     assert medium_matrix.get("q", "r") == 0.0
 
 
+def test_medium_matrix_get_batch(medium_matrix):
+    xs = ["a", "a", "b", "c", "c", "d", "a", "q", "a"]
+    ys = ["a", "b", "b", "a", "d", "c", "d", "a", "r"]
+    assert medium_matrix.get_batch(xs, ys) == [
+        medium_matrix.get(x, y) for x, y in zip(xs, ys)
+    ]
+    assert medium_matrix.get_batch(xs, ys) == [
+        1,
+        0.5,
+        0.2,
+        0.3,
+        1,
+        0.6,
+        0.0,
+        0.0,
+        0.0,
+    ]
+    assert medium_matrix.get_batch([], []) == []
+
+    with pytest.raises(ValueError):
+        medium_matrix.get_batch(["a", "b"], ["a"])
+
+
 def test_x_offset(medium_matrix):
     assert medium_matrix.x_offset("a") == 0
     assert medium_matrix.x_offset("b") == 1
@@ -174,6 +282,84 @@ def test_y_offset(medium_matrix):
     assert medium_matrix.y_offset("c") == 3
 
 
+def test_freeze(medium_matrix):
+    medium_matrix._freeze()
+
+    assert list(medium_matrix._indptr) == [0, 2, 4, 5, 6]
+    assert list(medium_matrix._indices) == [0, 2, 0, 1, 2, 3]
+    assert list(medium_matrix._values) == [1, 0.3, 0.5, 0.2, 1, 0.6]
+
+    # The columns are only built once needed.
+    assert medium_matrix._col_indptr is None
+    medium_matrix._freeze_columns()
+    assert list(medium_matrix._col_indptr) == [0, 2, 3, 5, 6]
+    assert list(medium_matrix._col_indices) == [0, 1, 1, 0, 2, 3]
+    assert list(medium_matrix._col_values) == [1, 0.5, 0.2, 0.3, 1, 0.6]
+
+    # Changing the matrix throws away the stale CSR data.
+    medium_matrix.set("b", "d", 0.1)
+    assert medium_matrix._indptr is None
+    assert medium_matrix._col_indptr is None
+
+    medium_matrix._freeze_columns()
+    assert list(medium_matrix._indptr) == [0, 2, 4, 6, 7]
+    assert list(medium_matrix._indices) == [0, 2, 0, 1, 1, 2, 3]
+    assert list(medium_matrix._col_indices) == [0, 1, 1, 2, 0, 2, 3]
+
+
+def test_freeze_value_storage(medium_matrix):
+    # The medium matrix has (int) `1`s, so the values stay a list.
+    medium_matrix._freeze_columns()
+    assert isinstance(medium_matrix._values, list)
+    assert isinstance(medium_matrix._col_values, list)
+
+    # All floats are packed into doubles.
+    mat = matrix.SparseMatrix.from_triples(
+        [("a", "a", 1.0), ("b", "a", 0.5), ("a", "b", 0.25)]
+    )
+    mat._freeze_columns()
+    assert mat._values.typecode == "d"
+    assert list(mat._values) == [1.0, 0.5, 0.25]
+    assert mat._col_values.typecode == "d"
+    assert list(mat._col_values) == [1.0, 0.25, 0.5]
+
+
+def test_label_at_offset(medium_matrix):
+    assert medium_matrix.label_at_x_offset(2) == "c"
+    assert medium_matrix.label_at_y_offset(2) == "d"
+    assert medium_matrix.label_at_x_offset(10) is None
+    assert medium_matrix.label_at_y_offset(-1) is None
+
+    # Kept up to date as labels are added.
+    medium_matrix.set("e", "e", 0.1)
+    assert medium_matrix.label_at_x_offset(4) == "e"
+    assert medium_matrix.label_at_y_offset(4) == "e"
+
+    # Missing labels have no offset, & no label at that offset.
+    assert medium_matrix.label_at_x_offset(medium_matrix.x_offset("nope")) is None
+    assert medium_matrix.label_at_y_offset(None) is None
+
+
+def test_from_data():
+    mat = matrix.SparseMatrix()
+    mat.set("a", "a", 0.5)
+    mat.set("b", "b", 0.5)
+    assert mat.label_at_x_offset(0) == "a"
+
+    # Same number of labels, but different ones.
+    label = "".join(["c", "c"])
+    mat = matrix.SparseMatrix.from_data(
+        {label: 0, "d": 1}, {"e": 0}, {0: {1: 0.25}}, default=-1
+    )
+    assert mat.x_labels_in_order == ["cc", "d"]
+    assert mat.label_at_x_offset(0) == "cc"
+    assert mat.label_at_x_offset(0) is sys.intern("cc")
+    assert mat.label_at_y_offset(0) == "e"
+    assert mat.get("d", "e") == 0.25
+    assert mat.get("cc", "e") == -1
+    assert mat.get_row("e") == [-1, 0.25]
+
+
 def test_get_sparse_row(medium_matrix):
     assert medium_matrix.get_sparse_row("a") == {"a": 1, "c": 0.3}
     assert medium_matrix.get_sparse_row("b") == {"a": 0.5, "b": 0.2}
@@ -181,6 +367,37 @@ def test_get_sparse_row(medium_matrix):
     assert medium_matrix.get_sparse_row("d") == {"c": 1}
 
 
+def test_get_sparse_row_view():
+    mat = matrix.SparseMatrix.from_triples(
+        [(x, y, float(value)) for x, y, value in MEDIUM_TRIPLES]
+    )
+
+    x_offsets, values = mat.get_sparse_row_view("a")
+    assert isinstance(x_offsets, memoryview)
+    assert isinstance(values, memoryview)
+    assert x_offsets.tolist() == [0, 2]
+    assert values.tolist() == [1.0, 0.3]
+
+    x_offsets, values = mat.get_sparse_row_view("c")
+    assert x_offsets.tolist() == [3]
+    assert values.tolist() == [0.6]
+
+    # Views into the compressed arrays, not copies.
+    assert values.obj is mat._values
+
+    x_offsets, values = mat.get_sparse_row_view("nope")
+    assert isinstance(x_offsets, memoryview)
+    assert isinstance(values, memoryview)
+    assert len(x_offsets) == 0
+    assert len(values) == 0
+
+
+def test_get_sparse_row_view_non_floats(medium_matrix):
+    # The (int) `1`s can't be viewed as doubles.
+    with pytest.raises(TypeError):
+        medium_matrix.get_sparse_row_view("a")
+
+
 def test_get_sparse_column(medium_matrix):
     assert medium_matrix.get_sparse_column("a") == {"a": 1, "b": 0.5}
     assert medium_matrix.get_sparse_column("b") == {"b": 0.2}
@@ -195,6 +412,49 @@ def test_get_row(medium_matrix):
     assert medium_matrix.get_row("d") == [0.0, 0.0, 1, 0.0]
 
 
+def test_get_row_column_without_data(small_matrix):
+    # Neither relies on any label caches having been built.
+    assert small_matrix.get_row("hello") == [0.0]
+    assert small_matrix.get_column("world") == [0.0]
+
+
+def test_exact_values(mixed_matrix):
+    assert mixed_matrix.get_row("a") == [2**60, "hello"]
+    assert mixed_matrix.get_row("b") == [3, None]
+    assert mixed_matrix.get_column("a") == [2**60, 3]
+    assert mixed_matrix.get_column("b") == ["hello", None]
+    assert mixed_matrix.get_sparse_row("a") == {"a": 2**60, "b": "hello"}
+    assert mixed_matrix.get_sparse_column("a") == {"a": 2**60, "b": 3}
+
+    # Every read agrees with `get`, cell-by-cell (& type-for-type).
+    for y_offset, y in enumerate(mixed_matrix.y_labels_in_order):
+        row = mixed_matrix.get_row(y)
+        sparse_row = mixed_matrix.get_sparse_row(y)
+
+        for x_offset, x in enumerate(mixed_matrix.x_labels_in_order):
+            expected = mixed_matrix.get(x, y)
+            column = mixed_matrix.get_column(x)
+            sparse_column = mixed_matrix.get_sparse_column(x)
+
+            for value in (
+                row[x_offset],
+                column[y_offset],
+                sparse_row.get(x, None),
+                sparse_column.get(y, None),
+            ):
+                assert value == expected
+                assert type(value) is type(expected)
+
+
+def test_get_row_array(medium_matrix):
+    row = medium_matrix.get_row_array("b")
+    assert row.typecode == "d"
+    assert list(row) == [0.5, 0.2, 0.0, 0.0]
+
+    # Not found, return all defaults.
+    assert list(medium_matrix.get_row_array("q")) == [0.0, 0.0, 0.0, 0.0]
+
+
 def test_get_column(medium_matrix):
     assert medium_matrix.get_column("a") == [1, 0.5, 0.0, 0.0]
     assert medium_matrix.get_column("b") == [0.0, 0.2, 0.0, 0.0]
@@ -202,6 +462,15 @@ def test_get_column(medium_matrix):
     assert medium_matrix.get_column("d") == [0.0, 0.0, 0.0, 0.6]
 
 
+def test_get_column_array(medium_matrix):
+    column = medium_matrix.get_column_array("c")
+    assert column.typecode == "d"
+    assert list(column) == [0.3, 0.0, 1, 0.0]
+
+    # Not found, return all defaults.
+    assert list(medium_matrix.get_column_array("q")) == [0.0, 0.0, 0.0, 0.0]
+
+
 def test_str(medium_matrix):
     assert str(medium_matrix) == "4x4"
 
@@ -225,3 +494,44 @@ def test_x_labels(medium_matrix):
 
 def test_y_labels(medium_matrix):
     assert medium_matrix.y_labels_in_order == ["a", "b", "d", "c"]
+
+
+def test_labels_in_order_after_set(medium_matrix):
+    assert medium_matrix.x_labels_in_order == ["a", "b", "c", "d"]
+
+    # Doesn't go stale as labels are added.
+    medium_matrix.set("e", "f", 0.1)
+    assert medium_matrix.x_labels_in_order == ["a", "b", "c", "d", "e"]
+    assert medium_matrix.y_labels_in_order == ["a", "b", "d", "c", "f"]
+
+
+def test_to_scipy_csr(medium_matrix):
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("scipy")
+
+    csr = medium_matrix.to_scipy_csr()
+    assert csr.shape == (4, 4)
+    assert csr.nnz == 6
+
+    for y in medium_matrix.y_labels:
+        y_offset = medium_matrix.y_offset(y)
+        assert csr[y_offset].toarray()[0].tolist() == medium_matrix.get_row(y)
+
+    # Row sums, as a single matrix-vector product.
+    totals = csr @ np.ones(4)
+    assert totals[medium_matrix.y_offset("a")] == pytest.approx(1.3)
+    assert totals[medium_matrix.y_offset("c")] == pytest.approx(0.6)
+
+    # All ints still gives floats.
+    int_matrix = matrix.SparseMatrix.from_triples([("a", "a", 1), ("b", "a", 2)])
+    csr = int_matrix.to_scipy_csr()
+    assert csr.dtype == np.float64
+    assert csr.toarray().tolist() == [[1.0, 2.0]]
+
+
+def test_to_scipy_csr_non_numbers():
+    mat = matrix.SparseMatrix(default=None)
+    mat.set("a", "a", "hello")
+
+    with pytest.raises(TypeError):
+        mat.to_scipy_csr()